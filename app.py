@@ -1,27 +1,168 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Request, Response, g, request, jsonify, render_template, send_from_directory
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import os
+import re
+import queue
+import secrets
+import threading
 import json
 import tempfile
 import base64
 import time
 
 # Import our modules
-from modules.transcription import transcribe_audio
-from modules.llm_interface import get_llm_response
-from modules.text_to_speech import text_to_speech
+from modules.transcription import transcribe_audio, warm_up_model
+from modules.llm_interface import get_llm_response, FALLBACK_RESPONSE
+from modules.text_to_speech import text_to_speech, text_to_speech_in_order, FALLBACK_SPEECH
 from modules.evaluator import evaluate_conversation
+from modules.response_cache import context_key, embed_utterance, find_response, store_response
+from modules.response_cache import warm_up_model as warm_up_cache_model
+
+class UploadRequest(Request):
+    """
+    Request that parses uploaded files straight into named temp files on disk
+    
+    The transcription model reads the upload by path, so writing it there as
+    the multipart body is parsed avoids buffering it and then copying it.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Keep the browser's format (opus/webm by default); the transcription
+        # model decodes it with ffmpeg
+        suffix = os.path.splitext(filename or '')[1] or '.webm'
+        stream = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        self.__dict__.setdefault("upload_paths", []).append(stream.name)
+        return stream
+    
+    def close(self):
+        super().close()
+        
+        # Clean up temp files
+        for path in self.__dict__.pop("upload_paths", []):
+            os.unlink(path)
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
 
-# Store conversation history and user profile
-conversation_history = []
-user_profile = {
-    "level": None,
-    "transcriptions": [],
-    "task_responses": {}
-}
+# Synthesizes response sentences while the LLM is still generating. Shared
+# by every session, so size it for the expected number of concurrent turns
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "16"))
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS)
+
+# Sentence boundary in a streamed response
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Greeting text and audio for each level, generated once and kept on disk
+GREETINGS_FILE = 'greetings_cache.json'
+greetings = {}
+greetings_lock = threading.Lock()
+
+class ConversationState:
+    """Conversation history and user profile for one browser session"""
+    __slots__ = ("history", "profile", "last_active")
+    
+    def __init__(self, level=None):
+        self.last_active = time.monotonic()
+        self.history = []
+        self.profile = {
+            "level": level,
+            "transcriptions": [],
+            "task_responses": {}
+        }
+
+class SpeculativeResponse:
+    """
+    LLM response to the browser's speech recognition transcript, streamed on a
+    background thread so generation can start before Whisper finishes
+    
+    Each speculation gets its own thread rather than a shared pool, so it never
+    waits behind other sessions' streams.
+    """
+    
+    def __init__(self, transcript, tokens):
+        self.transcript = transcript
+        self._tokens = tokens
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def matches(self, transcription):
+        """Check whether the final transcription agrees with the speculated one"""
+        return _normalize_transcript(transcription) == _normalize_transcript(self.transcript)
+    
+    @property
+    def failed(self):
+        """Whether the underlying LLM stream failed"""
+        return self._tokens.failed
+    
+    def cancel(self):
+        self._cancelled.set()
+    
+    def _run(self):
+        try:
+            # Don't open the Groq stream if cancelled before the thread started
+            if self._cancelled.is_set():
+                return
+            for token in self._tokens:
+                if self._cancelled.is_set():
+                    break
+                self._queue.put(token)
+        finally:
+            self._tokens.close()
+            self._queue.put(None)
+    
+    def __iter__(self):
+        while (token := self._queue.get()) is not None:
+            yield token
+
+# Conversation state per session, keyed by the session_id cookie and ordered
+# from least to most recently used
+SESSIONS = OrderedDict()
+sessions_lock = threading.Lock()
+
+# Sessions idle for longer than this are dropped (seconds)
+SESSION_TTL = 60 * 60
+
+# Maximum number of sessions kept, least recently used dropped first
+MAX_SESSIONS = 10000
+
+def _evict_sessions():
+    """Drop idle and excess sessions; sessions_lock must be held"""
+    now = time.monotonic()
+    while SESSIONS:
+        state = next(iter(SESSIONS.values()))
+        if now - state.last_active < SESSION_TTL and len(SESSIONS) <= MAX_SESSIONS:
+            break
+        SESSIONS.popitem(last=False)
+
+@app.before_request
+def load_session():
+    # State is only created by /set_level, so other requests (pages, static
+    # files, health checks) never add sessions
+    g.session_id = request.cookies.get('session_id')
+    g.state = None
+    if g.session_id is None:
+        return
+    
+    with sessions_lock:
+        _evict_sessions()
+        state = SESSIONS.get(g.session_id)
+        if state is not None:
+            state.last_active = time.monotonic()
+            SESSIONS.move_to_end(g.session_id)
+        g.state = state
+
+@app.after_request
+def save_session(response):
+    if g.get('session_id') and request.cookies.get('session_id') != g.session_id:
+        response.set_cookie('session_id', g.session_id, httponly=True, samesite='Lax')
+    return response
+
+def _session_expired():
+    return jsonify({"error": "Session expired, please choose a level to start again"}), 400
 
 @app.route('/')
 def index():
@@ -39,24 +180,20 @@ def set_level():
     if level not in ['Beginner', 'Intermediate', 'Advanced']:
         return jsonify({"error": "Invalid level"}), 400
     
-    # Reset conversation for new level
-    global conversation_history, user_profile
-    conversation_history = []
-    user_profile = {
-        "level": level,
-        "transcriptions": [],
-        "task_responses": {}
-    }
+    # Reset conversation for new level, starting a new session if needed
+    state = ConversationState(level)
+    if g.state is None:
+        g.session_id = secrets.token_urlsafe(32)
+    with sessions_lock:
+        SESSIONS[g.session_id] = state
+        SESSIONS.move_to_end(g.session_id)
+        _evict_sessions()
     
     # Get initial greeting based on level
-    system_prompt = f"You are an English conversation practice assistant for {level} level English learners. Start with a friendly greeting and ask a simple question to begin the conversation. Your Name is Sam"
-    response = get_llm_response(system_prompt, [])
-    
-    # Convert to speech
-    audio_base64 = text_to_speech(response)
+    response, audio_base64 = get_greeting(level)
     
     # Add to conversation history
-    conversation_history.append({
+    state.history.append({
         "role": "assistant",
         "content": response
     })
@@ -71,107 +208,139 @@ def process_audio():
     if 'audio' not in request.files:
         return jsonify({"error": "No audio file"}), 400
     
+    # A session without a level (e.g. after a restart) has no system prompt
+    state = g.state
+    if state is None or state.profile["level"] is None:
+        return _session_expired()
+    
+    # The upload was parsed straight into a temp file, removed when the request closes
     audio_file = request.files['audio']
+    audio_file.stream.flush()
     
-    # Save temp file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    audio_file.save(temp_file.name)
-    temp_file.close()
+    # Start the LLM on the browser's transcript while Whisper transcribes
+    speculation = _speculate(state, request.form.get('transcript'))
+    user_message = None
     
     try:
         # Transcribe audio
-        transcription = transcribe_audio(temp_file.name)
-        user_profile["transcriptions"].append(transcription)
+        transcription = transcribe_audio(audio_file.stream.name)
+        state.profile["transcriptions"].append(transcription)
+        
+        # Key the cache on the context before the new utterance joins the history
+        cache_context = context_key(state.profile["level"], state.history)
         
         # Add to conversation history
-        conversation_history.append({
+        user_message = {
             "role": "user",
             "content": transcription
-        })
+        }
+        state.history.append(user_message)
         
         # Check if this is a task response
         is_task_response = False
-        for task_id, task in user_profile["task_responses"].items():
+        for task_id, task in state.profile["task_responses"].items():
             if task["status"] == "assigned":
-                user_profile["task_responses"][task_id]["response"] = transcription
-                user_profile["task_responses"][task_id]["status"] = "completed"
+                state.profile["task_responses"][task_id]["response"] = transcription
+                state.profile["task_responses"][task_id]["status"] = "completed"
                 is_task_response = True
                 break
         
-        # Generate assistant response based on level and conversation history
-        system_prompt = generate_system_prompt(user_profile["level"], is_task_response)
-        response = get_llm_response(system_prompt, conversation_history)
+        # Reuse a previous response for near-duplicate exchanges, unless this
+        # turn involves task feedback or task assignment
+        cacheable = not is_task_response and not should_assign_task(state)
+        cache_key = embed_utterance(transcription) if cacheable else None
+        cached = find_response(cache_context, cache_key) if cacheable else None
+        if cached is not None:
+            if speculation is not None:
+                speculation.cancel()
+            sentences, audio_chunks = cached
+            state.history.append({
+                "role": "assistant",
+                "content": " ".join(sentences)
+            })
+            return _ndjson_response(_replay_response(transcription, sentences, audio_chunks))
         
-        # Check if response contains a task
-        if "TASK:" in response:
-            task_parts = response.split("TASK:")
-            response = task_parts[0].strip()
-            task_description = task_parts[1].strip()
-            
-            # Register the task
-            task_id = f"task_{len(user_profile['task_responses']) + 1}"
-            user_profile["task_responses"][task_id] = {
-                "description": task_description,
-                "status": "assigned",
-                "response": None
-            }
-        
-        # Add to conversation history
-        conversation_history.append({
-            "role": "assistant",
-            "content": response
-        })
+        # Generate assistant response based on level and conversation history,
+        # reusing the speculative response if the transcripts agree
+        if speculation is not None and speculation.matches(transcription):
+            tokens = speculation
+        else:
+            if speculation is not None:
+                speculation.cancel()
+            system_prompt = generate_system_prompt(state.profile["level"])
+            turn_directive = generate_turn_directive(state, is_task_response)
+            tokens = get_llm_response(system_prompt, state.history, turn_directive, stream=True)
         
-        # Convert to speech
-        audio_base64 = text_to_speech(response)
+        def generate():
+            yield {"transcription": transcription}
+            
+            # Speak each sentence as soon as the LLM finishes it
+            task_parts = []
+            sentences = []
+            audio_chunks = []
+            try:
+                for sentence, audio_base64 in text_to_speech_in_order(_spoken_sentences(tokens, task_parts), tts_executor):
+                    sentences.append(sentence)
+                    audio_chunks.append(audio_base64)
+                    yield {"response": sentence, "audio": audio_base64}
+            finally:
+                # Keep user and assistant turns alternating even if the stream
+                # fails or the client disconnects partway
+                if sentences:
+                    state.history.append({
+                        "role": "assistant",
+                        "content": " ".join(sentences)
+                    })
+                else:
+                    _remove_message(state.history, user_message)
+            
+            response = " ".join(sentences)
+            
+            # Check if response contains a task
+            if task_parts:
+                task_description = " ".join(task_parts).strip()
+                
+                # Register the task
+                task_id = f"task_{len(state.profile['task_responses']) + 1}"
+                state.profile["task_responses"][task_id] = {
+                    "description": task_description,
+                    "status": "assigned",
+                    "response": None
+                }
+            
+            # Only cache complete responses with real speech for every sentence
+            if cacheable and not tokens.failed and FALLBACK_SPEECH not in audio_chunks:
+                store_response(cache_context, cache_key, sentences, audio_chunks)
+            
+            yield {"done": True, "response": response}
         
-        return jsonify({
-            "transcription": transcription,
-            "response": response,
-            "audio": audio_base64
-        })
+        return _ndjson_response(generate())
         
     except Exception as e:
+        if speculation is not None:
+            speculation.cancel()
+        
+        # Don't leave an unanswered user turn in the history
+        if user_message is not None:
+            _remove_message(state.history, user_message)
         return jsonify({"error": str(e)}), 500
-    finally:
-        # Clean up temp file
-        os.unlink(temp_file.name)
 
 @app.route('/end_conversation', methods=['POST'])
 def end_conversation():
+    state = g.state
+    if state is None:
+        return _session_expired()
+    
     # Generate evaluation report
-    evaluation = evaluate_conversation(user_profile, conversation_history)
+    evaluation = evaluate_conversation(state.profile, state.history)
     
     return jsonify({
         "report": evaluation
     })
 
-def generate_system_prompt(level, is_task_response=False):
-    """Generate appropriate system prompt based on user level and context"""
-    if is_task_response:
-        return f"""You are an English conversation practice assistant for {level} level English learners.
-        The user just completed a speaking task you assigned. Give positive feedback first, then 1-2 specific improvement suggestions.
-        Keep your response friendly, encouraging and concise. Don't assign a new task yet."""
-    
-    task_probability = {
-        "Beginner": 0.2,
-        "Intermediate": 0.3,
-        "Advanced": 0.4
-    }
-    
-    # Determine if we should assign a task based on conversation length
-    should_assign_task = len(conversation_history) >= 4 and len(user_profile["task_responses"]) < 2
-    assign_task_directive = ""
-    
-    if should_assign_task:
-        assign_task_directive = """
-        In your response, include a speaking task for the user by adding "TASK:" followed by the task description.
-        For Beginner: Simple tasks like "Describe your family" or "Talk about your daily routine"
-        For Intermediate: Moderate tasks like "Explain the plot of your favorite movie" or "Describe a problem in your city"
-        For Advanced: Complex tasks like "Argue for or against remote work" or "Discuss the impact of AI on society"
-        """
-    
-    base_prompt = f"""You are an English conversation practice assistant for {level} level English learners.
+def _build_system_prompt(level):
+    """Build the static system prompt for a level"""
+    return f"""You are an English conversation practice assistant for {level} level English learners.
     Adjust your vocabulary and sentence complexity to match their {level} level.
     
     Beginner: Use simple vocabulary, short sentences, and basic grammar.
@@ -179,15 +348,190 @@ def generate_system_prompt(level, is_task_response=False):
     Advanced: Use sophisticated vocabulary, complex sentences, idioms, and discuss abstract topics.
     
     Keep the conversation natural, engaging and flowing. Ask follow-up questions to encourage the user to speak more.
-    {assign_task_directive}
     
     Important:
     - Keep your responses concise (3-5 sentences)
     - Don't summarize the conversation
     - Don't mention that you're an AI unless the user asks
     - Focus on having a natural conversation"""
+
+# System prompts are identical on every turn so the provider can cache the prefix
+SYSTEM_PROMPTS = {level: _build_system_prompt(level) for level in ['Beginner', 'Intermediate', 'Advanced']}
+
+TASK_FEEDBACK_DIRECTIVE = """The user just completed a speaking task you assigned. Give positive feedback first, then 1-2 specific improvement suggestions.
+    Keep your response friendly, encouraging and concise. Don't assign a new task yet."""
+
+ASSIGN_TASK_DIRECTIVE = """In your response, include a speaking task for the user by adding "TASK:" followed by the task description.
+    For Beginner: Simple tasks like "Describe your family" or "Talk about your daily routine"
+    For Intermediate: Moderate tasks like "Explain the plot of your favorite movie" or "Describe a problem in your city"
+    For Advanced: Complex tasks like "Argue for or against remote work" or "Discuss the impact of AI on society"
+    """
+
+def generate_system_prompt(level):
+    """Get the static system prompt for the user's level"""
+    return SYSTEM_PROMPTS[level]
+
+def generate_turn_directive(state, is_task_response=False):
+    """Generate per-turn instructions, sent after the conversation history"""
+    if is_task_response:
+        return TASK_FEEDBACK_DIRECTIVE
+    
+    if should_assign_task(state):
+        return ASSIGN_TASK_DIRECTIVE
+    
+    return None
+
+def _ndjson_response(messages):
+    """Stream an iterable of dicts to the client as newline-delimited JSON"""
+    def generate():
+        try:
+            for message in messages:
+                yield json.dumps(message) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _replay_response(transcription, sentences, audio_chunks):
+    """Replay a cached response in the same format as a generated one"""
+    yield {"transcription": transcription}
+    for sentence, audio_base64 in zip(sentences, audio_chunks):
+        yield {"response": sentence, "audio": audio_base64}
+    yield {"done": True, "response": " ".join(sentences)}
+
+def _spoken_sentences(tokens, task_parts):
+    """
+    Group streamed tokens into complete sentences to be spoken
+    
+    Anything after "TASK:" is collected into task_parts instead of being spoken.
+    """
+    def sentences():
+        buffer = ""
+        for token in tokens:
+            buffer += token
+            parts = SENTENCE_END.split(buffer)
+            buffer = parts.pop()
+            yield from parts
+        if buffer.strip():
+            yield buffer
+    
+    for sentence in sentences():
+        if task_parts:
+            task_parts.append(sentence)
+            continue
+        
+        if "TASK:" in sentence:
+            sentence, task_description = sentence.split("TASK:", 1)
+            task_parts.append(task_description)
+        
+        sentence = sentence.strip()
+        if sentence:
+            yield sentence
+
+def _remove_message(history, message):
+    """Remove a specific message object from the history, if still present"""
+    for index in range(len(history) - 1, -1, -1):
+        if history[index] is message:
+            del history[index]
+            return
+
+def _speculate(state, transcript):
+    """
+    Start generating a response to the browser's speech recognition transcript
+    
+    The prompt is built exactly as process_audio builds it once the user's
+    message is in the history, so the response can be used as-is when Whisper
+    produces the same text.
+    """
+    transcript = (transcript or "").strip()
+    if not transcript or state.profile["level"] is None:
+        return None
+    
+    preview = ConversationState(state.profile["level"])
+    preview.history = state.history + [{"role": "user", "content": transcript}]
+    preview.profile = state.profile
     
-    return base_prompt
+    is_task_response = any(task["status"] == "assigned" for task in state.profile["task_responses"].values())
+    system_prompt = generate_system_prompt(preview.profile["level"])
+    turn_directive = generate_turn_directive(preview, is_task_response)
+    tokens = get_llm_response(system_prompt, preview.history, turn_directive, stream=True)
+    
+    return SpeculativeResponse(transcript, tokens)
+
+def _normalize_transcript(text):
+    """Lowercase words only, ignoring punctuation and spacing differences"""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+def should_assign_task(state):
+    """Determine if we should assign a task based on conversation length"""
+    return len(state.history) >= 4 and len(state.profile["task_responses"]) < 2
+
+def generate_greeting(level):
+    """Generate the initial greeting for a level and convert it to speech"""
+    system_prompt = f"You are an English conversation practice assistant for {level} level English learners. Start with a friendly greeting and ask a simple question to begin the conversation. Your Name is Sam"
+    response = get_llm_response(system_prompt, [])
+    
+    # Convert to speech
+    audio_base64 = text_to_speech(response)
+    
+    return response, audio_base64
+
+def is_complete_greeting(greeting):
+    """Check that neither the LLM nor TTS fell back while generating a greeting"""
+    response, audio_base64 = greeting
+    return response != FALLBACK_RESPONSE and audio_base64 != FALLBACK_SPEECH
+
+def get_greeting(level):
+    """Return the greeting for a level, generating and saving it on first use"""
+    greeting = greetings.get(level)
+    if greeting is not None:
+        return greeting
+    
+    # Only one thread generates at a time; the others reuse its result
+    with greetings_lock:
+        greeting = greetings.get(level)
+        if greeting is not None:
+            return greeting
+        
+        greeting = generate_greeting(level)
+        
+        # Don't keep the error fallbacks; retry on the next request instead
+        if is_complete_greeting(greeting):
+            greetings[level] = greeting
+            with open(GREETINGS_FILE, 'w') as f:
+                json.dump(greetings, f)
+        
+        return greeting
+
+def _generate_greetings(levels):
+    """Generate and save the greetings for the given levels"""
+    for level in levels:
+        get_greeting(level)
+
+def load_greetings():
+    """
+    Load the per-level greetings from disk and generate any missing ones on a
+    background thread, so startup doesn't wait on the LLM or TTS services
+    """
+    if os.path.exists(GREETINGS_FILE):
+        with open(GREETINGS_FILE) as f:
+            saved = {level: tuple(greeting) for level, greeting in json.load(f).items()}
+        greetings.update({level: greeting for level, greeting in saved.items() if is_complete_greeting(greeting)})
+    
+    missing = [level for level in SYSTEM_PROMPTS if level not in greetings]
+    if missing:
+        threading.Thread(target=_generate_greetings, args=(missing,), daemon=True).start()
+
+def warm_up():
+    """Load the models and greetings before the first request"""
+    warm_up_model()
+    warm_up_cache_model()
+    load_greetings()
+
+# With debug=True the Werkzeug reloader's parent process only watches for file
+# changes, so leave loading the models to the child that serves requests
+if __name__ != '__main__' or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    warm_up()
 
 if __name__ == '__main__':
     # Create directories if they don't exist
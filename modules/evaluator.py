@@ -1,6 +1,29 @@
 import re
+import json
 from modules.llm_interface import get_llm_response
 
+# Common ESL mistakes (simplified patterns) and their descriptions
+_PATTERNS = [
+    (r'\bi am (agree|disagree)', "Using 'I am agree' instead of 'I agree'"),
+    (r'\bthe\s+([a-z]+ing)\b', "Potentially incorrect use of 'the' with gerund"),
+    (r'\b(make|makes|made)\s+fun\b', "Using 'make fun' instead of 'have fun'"),
+    (r'\b(is|are|was|were)\s+consist', "Using 'is consist of' instead of 'consists of'"),
+    (r'\bdiscuss\s+about\b', "Using 'discuss about' instead of just 'discuss'"),
+    (r'\badvice\s+(to|for)\s+\w+\b', "Using 'advice to' instead of 'advise'"),
+    (r'\b(look|looks|looked)\s+forward\s+to\s+([a-z]+ing)', "Correct use of 'look forward to' + gerund"),
+    (r'\b(look|looks|looked)\s+forward\s+to\s+(\w+[^ing\s])\b', "Incorrect use of 'look forward to' without gerund"),
+]
+
+# All mistake patterns combined into one alternation, one named group per pattern.
+# Each alternative is a lookahead so matches don't consume text and can overlap.
+# Patterns are lowercase and matched against lowercased text.
+_MISTAKE_RE = re.compile(
+    "|".join(f"(?=(?P<m{i}>{pattern}))" for i, (pattern, _) in enumerate(_PATTERNS))
+)
+_PATTERN_RES = [re.compile(pattern) for pattern, _ in _PATTERNS]
+
+_WORD_RE = re.compile(r'\b\w+\b')
+
 def evaluate_conversation(user_profile, conversation_history):
     """
     Evaluate the user's English speaking skills based on the conversation history
@@ -23,16 +46,18 @@ def evaluate_conversation(user_profile, conversation_history):
     # Extract only the user's messages from conversation history
     user_messages = [msg["content"] for msg in conversation_history if msg["role"] == "user"]
     
+    # Join and lowercase the transcript once for all text metrics
+    all_user_text = " ".join(user_messages).lower()
+    
     # Basic metrics
-    word_count = count_words(" ".join(user_messages))
+    word_count, unique_words = word_stats(all_user_text)
     avg_words_per_message = word_count / len(user_messages) if user_messages else 0
     
     # Calculate vocabulary richness (unique words / total words)
-    unique_words = count_unique_words(" ".join(user_messages))
     vocabulary_richness = unique_words / word_count if word_count > 0 else 0
     
     # Extract common grammar mistakes using pattern matching
-    common_mistakes = extract_common_mistakes(" ".join(user_messages))
+    common_mistakes = extract_common_mistakes(all_user_text)
     
     # Use LLM for detailed evaluation
     llm_evaluation = get_detailed_evaluation(level, user_messages)
@@ -49,41 +74,36 @@ def evaluate_conversation(user_profile, conversation_history):
     
     return report
 
-def count_words(text):
-    """Count the number of words in text"""
-    words = re.findall(r'\b\w+\b', text.lower())
-    return len(words)
-
-def count_unique_words(text):
-    """Count the number of unique words in text"""
-    words = re.findall(r'\b\w+\b', text.lower())
-    return len(set(words))
+def word_stats(text):
+    """Count the total and unique number of words in lowercased text"""
+    words = _WORD_RE.findall(text)
+    return len(words), len(set(words))
 
 def extract_common_mistakes(text):
     """
-    Extract common grammar mistakes using pattern matching
+    Extract common grammar mistakes from lowercased text using pattern matching
     This is a simplified version - for production use, consider more sophisticated NLP
     """
-    mistakes = []
-    
-    # Check for common ESL mistakes (simplified patterns)
-    patterns = [
-        (r'\bi am (agree|disagree)', "Using 'I am agree' instead of 'I agree'"),
-        (r'\bthe\s+([a-z]+ing)\b', "Potentially incorrect use of 'the' with gerund"),
-        (r'\b(make|makes|made)\s+fun\b', "Using 'make fun' instead of 'have fun'"),
-        (r'\b(is|are|was|were)\s+consist', "Using 'is consist of' instead of 'consists of'"),
-        (r'\bdiscuss\s+about\b', "Using 'discuss about' instead of just 'discuss'"),
-        (r'\badvice\s+(to|for)\s+\w+\b', "Using 'advice to' instead of 'advise'"),
-        (r'\b(look|looks|looked)\s+forward\s+to\s+([a-z]+ing)', "Correct use of 'look forward to' + gerund"),
-        (r'\b(look|looks|looked)\s+forward\s+to\s+(\w+[^ing\s])\b', "Incorrect use of 'look forward to' without gerund"),
-    ]
-    
-    for pattern, description in patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            mistakes.append(description)
-    
-    # Limit to top 3 unique mistakes
-    return list(set(mistakes))[:3]
+    # Insertion-ordered set, so mistakes are reported in the order they occur
+    mistakes = {}
+    
+    # Single pass over the text; the matching group identifies the first pattern
+    # matching at each position, and later patterns are checked at that position
+    # too since the alternation stops at the first match
+    for match in _MISTAKE_RE.finditer(text):
+        first = int(match.lastgroup[1:])
+        for i in range(first, len(_PATTERNS)):
+            description = _PATTERNS[i][1]
+            if description in mistakes:
+                continue
+            if i == first or _PATTERN_RES[i].match(text, match.start()):
+                mistakes[description] = None
+                
+                # Limit to top 3 unique mistakes
+                if len(mistakes) == 3:
+                    return list(mistakes)
+    
+    return list(mistakes)
 
 def get_detailed_evaluation(level, user_messages):
     """
@@ -94,7 +114,8 @@ def get_detailed_evaluation(level, user_messages):
         user_messages: List of user's messages
     
     Returns:
-        Detailed evaluation
+        Dict with fluency, pronunciation, grammar, vocabulary and suggestions,
+        or the raw text if the LLM did not return valid JSON
     """
     # Prepare prompt for the LLM
     all_user_text = "\n".join([f"- {msg}" for msg in user_messages])
@@ -104,19 +125,21 @@ def get_detailed_evaluation(level, user_messages):
     Here are all the learner's spoken responses (transcribed):
     {all_user_text}
     
-    Please provide a detailed but concise evaluation covering:
-    1. Fluency (smoothness of speech, hesitations)
-    2. Pronunciation (any noticeable patterns or issues)
-    3. Grammar usage (strengths and weaknesses)
-    4. Vocabulary richness (variety and appropriateness)
-    5. Three specific suggestions for improvement
+    Evaluate the learner and respond with a JSON object with exactly these keys:
+    "fluency": smoothness of speech and hesitations, 1-2 sentences
+    "pronunciation": any noticeable patterns or issues, 1-2 sentences
+    "grammar": strengths and weaknesses, 1-2 sentences
+    "vocabulary": variety and appropriateness, 1-2 sentences
+    "suggestions": a list of three specific suggestions for improvement
     
     Keep your evaluation constructive, encouraging, and appropriate for a {level} level learner.
-    Format your response as a structured evaluation without mentioning that you're an AI.
-    Limit your response to approximately 300 words.
+    Don't mention that you're an AI.
     """
     
-    # Get evaluation from LLM
-    evaluation = get_llm_response(prompt, [])
+    # Get evaluation from LLM as a single structured completion
+    evaluation = get_llm_response(prompt, [], response_format={"type": "json_object"}, max_tokens=350)
     
-    return evaluation
\ No newline at end of file
+    try:
+        return json.loads(evaluation)
+    except json.JSONDecodeError:
+        return evaluation
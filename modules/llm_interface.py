@@ -1,60 +1,129 @@
 import os
 import groq
 import time
+import random
+import httpx
 
-# You'll need to set your Groq API key as an environment variable
-# os.environ["GROQ_API_KEY"] = "your-api-key-here"
+# You'll need to set your Groq API key as an environment variable:
+# export GROQ_API_KEY="your-api-key-here"
 
-# Initialize Groq client
-client = groq.Client(api_key="YOUR API KEY")
+# Initialize Groq client, reusing one pooled HTTP/2 connection for the process
+client = groq.Client(
+    api_key=os.environ["GROQ_API_KEY"],
+    http_client=httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    ),
+)
 
-def get_llm_response(system_prompt, conversation_history):
+# Number of most recent conversation messages sent with each request
+MAX_HISTORY_MESSAGES = 12
+
+FALLBACK_RESPONSE = "I'm sorry, I'm having trouble generating a response right now. Could you please repeat what you said?"
+
+def get_llm_response(system_prompt, conversation_history, turn_directive=None, stream=False,
+                     response_format=None, max_tokens=500):
     """
     Get a response from the Groq LLM
     
     Args:
         system_prompt: System prompt to guide the model's behavior
         conversation_history: List of previous conversation messages
+        turn_directive: Optional instructions for this turn only, sent after the
+            history so the system prompt prefix stays identical across turns
+        stream: Whether to stream the response as it is generated
+        response_format: Optional response format, e.g. {"type": "json_object"}
+        max_tokens: Maximum number of tokens to generate
     
     Returns:
-        Generated text response
+        Generated text response, or an LLMStream of text deltas if stream is True
     """
+    # Format conversation history for the API, keeping only the latest
+    # messages so the prompt stays bounded as the conversation grows
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    for msg in conversation_history[-MAX_HISTORY_MESSAGES:]:
+        messages.append({
+            "role": msg["role"],
+            "content": msg["content"]
+        })
+    
+    if turn_directive:
+        messages.append({"role": "system", "content": turn_directive})
+    
+    if stream:
+        return LLMStream(messages, response_format, max_tokens)
+    
     try:
-        # Format conversation history for the API
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        for msg in conversation_history:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        response = _create_completion(messages, response_format=response_format, max_tokens=max_tokens)
         
-        # Retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Call Groq API with LLama2-70b for good balance of performance and cost
-                response = client.chat.completions.create(
-                    model="llama3-70b-8192",
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=500,
-                    top_p=0.9,
-                )
-                
-                # Extract and return the generated text
-                return response.choices[0].message.content
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    # Exponential backoff
-                    wait_time = 2 ** attempt
-                    print(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    raise e
+        # Extract and return the generated text
+        return response.choices[0].message.content
                     
     except Exception as e:
         print(f"Error getting LLM response: {e}")
         # Fallback response
-        return "I'm sorry, I'm having trouble generating a response right now. Could you please repeat what you said?"
+        return FALLBACK_RESPONSE
+
+class LLMStream:
+    """
+    Iterator of text deltas from a streamed completion
+    
+    If the request fails, iteration ends early and failed is set; when nothing
+    was received yet, the fallback response is yielded so the user hears something.
+    """
+    
+    def __init__(self, messages, response_format, max_tokens):
+        self.failed = False
+        self._deltas = self._generate(messages, response_format, max_tokens)
+    
+    def __iter__(self):
+        return self._deltas
+    
+    def close(self):
+        self._deltas.close()
+    
+    def _generate(self, messages, response_format, max_tokens):
+        received = False
+        try:
+            for chunk in _create_completion(messages, stream=True, response_format=response_format, max_tokens=max_tokens):
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    received = True
+                    yield delta
+                    
+        except Exception as e:
+            print(f"Error streaming LLM response: {e}")
+            self.failed = True
+            if not received:
+                # Fallback response
+                yield FALLBACK_RESPONSE
+
+def _create_completion(messages, stream=False, response_format=None, max_tokens=500):
+    """Call the Groq API with retry logic"""
+    # Only send response_format when requested
+    options = {"response_format": response_format} if response_format else {}
+    
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            # Call Groq API with LLama2-70b for good balance of performance and cost
+            return client.chat.completions.create(
+                model="llama3-70b-8192",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                top_p=0.9,
+                stream=stream,
+                **options,
+            )
+            
+        except Exception as e:
+            if attempt < max_retries - 1:
+                # Exponential backoff with jitter so concurrent retries spread out
+                wait_time = 2 ** attempt + random.random() * 0.5
+                print(f"Retrying in {wait_time:.1f} seconds...")
+                time.sleep(wait_time)
+            else:
+                raise e
@@ -0,0 +1,139 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Cosine similarity above which a previous utterance is considered a repeat
+SIMILARITY_THRESHOLD = 0.9
+
+# Number of previous conversation messages that must match exactly
+CONTEXT_MESSAGES = 2
+
+# Maximum number of distinct contexts kept, least recently used evicted first
+MAX_CONTEXTS = 1000
+
+# Maximum number of cached exchanges kept per context
+MAX_ENTRIES_PER_CONTEXT = 100
+
+# Small, fast sentence-embedding model (384 dimensions)
+model = None
+
+# Cached exchanges bucketed by context: {context: {"matrix": ndarray, "entries": [(sentences, audio_chunks)]}}
+_buckets = OrderedDict()
+_lock = threading.Lock()
+
+def load_model():
+    global model
+    if model is None:
+        model = SentenceTransformer("all-MiniLM-L6-v2")
+    return model
+
+def warm_up_model():
+    """Load the embedding model before the first request"""
+    try:
+        load_model().encode("Hello", normalize_embeddings=True)
+    except Exception as e:
+        print(f"Error loading response cache model: {e}")
+
+def context_key(level, conversation_history):
+    """
+    Hash the level and the last few conversation messages
+    
+    Only exchanges with exactly the same context are compared, so a long
+    shared message such as the level greeting can't make different user
+    replies look alike.
+    
+    Args:
+        level: User's English level
+        conversation_history: Conversation history before the user's utterance
+    
+    Returns:
+        Hex digest identifying the context
+    """
+    context = [[msg["role"], msg["content"]] for msg in conversation_history[-CONTEXT_MESSAGES:]]
+    payload = json.dumps([level, context])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def embed_utterance(transcription):
+    """
+    Embed the user's utterance
+    
+    The cache is only an optimization, so any error here is treated as a miss.
+    
+    Args:
+        transcription: Transcribed user utterance
+    
+    Returns:
+        Normalized float32 embedding vector, or None if embedding failed
+    """
+    try:
+        embedding = load_model().encode(transcription, normalize_embeddings=True)
+        return np.asarray(embedding, dtype=np.float32)
+    except Exception as e:
+        print(f"Error embedding utterance: {e}")
+        return None
+
+def find_response(context, embedding):
+    """
+    Look up a previously generated response for a near-duplicate utterance
+    
+    Args:
+        context: Key returned by context_key
+        embedding: Embedding returned by embed_utterance
+    
+    Returns:
+        (sentences, audio_chunks) tuple, or None on a cache miss
+    """
+    if embedding is None:
+        return None
+    
+    try:
+        with _lock:
+            bucket = _buckets.get(context)
+            if bucket is None:
+                return None
+            _buckets.move_to_end(context)
+            
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            similarities = bucket["matrix"] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < SIMILARITY_THRESHOLD:
+                return None
+            
+            return bucket["entries"][best]
+    except Exception as e:
+        print(f"Error looking up cached response: {e}")
+        return None
+
+def store_response(context, embedding, sentences, audio_chunks):
+    """
+    Store a generated response and its audio for later reuse
+    
+    Args:
+        context: Key returned by context_key
+        embedding: Embedding returned by embed_utterance
+        sentences: Sentences of the assistant response
+        audio_chunks: Base64 encoded audio for each sentence
+    """
+    if embedding is None:
+        return
+    
+    try:
+        with _lock:
+            bucket = _buckets.get(context)
+            if bucket is None:
+                _buckets[context] = {
+                    "matrix": embedding[np.newaxis, :],
+                    "entries": [(sentences, audio_chunks)]
+                }
+                if len(_buckets) > MAX_CONTEXTS:
+                    _buckets.popitem(last=False)
+                return
+            
+            _buckets.move_to_end(context)
+            bucket["matrix"] = np.vstack([bucket["matrix"], embedding])[-MAX_ENTRIES_PER_CONTEXT:]
+            bucket["entries"] = (bucket["entries"] + [(sentences, audio_chunks)])[-MAX_ENTRIES_PER_CONTEXT:]
+    except Exception as e:
+        print(f"Error storing cached response: {e}")
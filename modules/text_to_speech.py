@@ -1,12 +1,22 @@
-import os
+import io
+import queue
 import base64
-import tempfile
+import hashlib
+import functools
+import threading
 import sounddevice as sd
-import soundfile as sf
 import numpy as np
 from scipy.io import wavfile
+from diskcache import Cache
 import requests
 
+# Synthesized speech keyed by text hash, shared across restarts
+disk_cache = Cache('.tts_cache')
+
+# Seconds to wait for the TTS API before falling back to the tone, so a hung
+# call can't hold a synthesis worker indefinitely
+TTS_TIMEOUT = 10
+
 def text_to_speech(text):
     """
     Convert text to speech using a basic synthesis approach.
@@ -22,50 +32,103 @@ def text_to_speech(text):
         Base64 encoded audio data
     """
     try:
-        # For demo purposes, we'll use a free TTS API
-        # In production, replace with a more reliable service
-        url = "https://api.streamelements.com/kappa/v2/speech"
-        params = {
-            "voice": "en-US-Standard-C",  # Female voice
-            "text": text
-        }
-        
-        response = requests.get(url, params=params)
-        
-        if response.status_code == 200:
-            # Save audio to temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            temp_file.write(response.content)
-            temp_file.close()
-            
-            # Generate a temp WAV file for consistency
-            wav_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-            wav_temp.close()
-            
-            # Use soundfile to convert mp3 to wav
-            data, sample_rate = sf.read(temp_file.name)
-            sf.write(wav_temp.name, data, sample_rate)
-            
-            # Read wav file and encode to base64
-            with open(wav_temp.name, "rb") as wav_file:
-                encoded_string = base64.b64encode(wav_file.read()).decode('utf-8')
-            
-            # Clean up temp files
-            os.unlink(temp_file.name)
-            os.unlink(wav_temp.name)
-            
-            return encoded_string
-        
-        else:
-            # Fallback to a simple tone generation
-            return _generate_fallback_speech()
+        return _synthesize(text)
             
     except Exception as e:
         print(f"Error in text_to_speech: {e}")
         # Fallback to simple tone
         return _generate_fallback_speech()
 
+def text_to_speech_in_order(sentences, executor):
+    """
+    Synthesize sentences in parallel, yielding (sentence, audio) in original order
+    
+    Sentences are read on a producer thread, so each sentence's audio is
+    yielded as soon as it is ready instead of when the next sentence arrives.
+    
+    Args:
+        sentences: Iterable of sentences, e.g. read from a streamed LLM response
+        executor: Executor to synthesize the sentences on
+        
+    Yields:
+        (sentence, base64 encoded audio) tuples
+    """
+    events = queue.Queue()
+    stopped = threading.Event()
+    
+    def produce():
+        count = 0
+        try:
+            for index, sentence in enumerate(sentences):
+                # Stop reading the LLM once the client has gone away
+                if stopped.is_set():
+                    break
+                future = executor.submit(text_to_speech, sentence)
+                future.add_done_callback(lambda future, index=index, sentence=sentence: events.put(("audio", index, sentence, future)))
+                count = index + 1
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            events.put(("end", count))
+    
+    threading.Thread(target=produce, daemon=True).start()
+    
+    ready = {}
+    next_index = 0
+    total = None
+    error = None
+    try:
+        while total is None or next_index < total:
+            event = events.get()
+            if event[0] == "audio":
+                _, index, sentence, future = event
+                ready[index] = (sentence, future)
+            elif event[0] == "error":
+                error = event[1]
+            else:
+                total = event[1]
+            
+            # Emit every leading sentence whose audio is done
+            while next_index in ready:
+                sentence, future = ready.pop(next_index)
+                yield sentence, future.result()
+                next_index += 1
+    finally:
+        stopped.set()
+    
+    if error is not None:
+        raise error
+
+@functools.lru_cache(maxsize=512)
+def _synthesize(text):
+    """Fetch base64 encoded speech for text, using the on-disk cache when possible"""
+    key = hashlib.sha1(text.encode()).hexdigest()
+    encoded_string = disk_cache.get(key)
+    if encoded_string is not None:
+        return encoded_string
+    
+    # For demo purposes, we'll use a free TTS API
+    # In production, replace with a more reliable service
+    url = "https://api.streamelements.com/kappa/v2/speech"
+    params = {
+        "voice": "en-US-Standard-C",  # Female voice
+        "text": text
+    }
+    
+    response = requests.get(url, params=params, timeout=TTS_TIMEOUT)
+    response.raise_for_status()
+    
+    # The browser plays the returned mp3 as-is
+    encoded_string = base64.b64encode(response.content).decode('utf-8')
+    disk_cache.set(key, encoded_string)
+    
+    return encoded_string
+
 def _generate_fallback_speech():
+    """Return the precomputed fallback tone"""
+    return FALLBACK_SPEECH
+
+def _make_fallback_tone():
     """Generate a simple audio tone as fallback"""
     try:
         # Generate a simple tone
@@ -73,41 +136,36 @@ def _generate_fallback_speech():
         duration = 1  # seconds
         frequency = 440  # Hz - A4 note
         
-        # Generate time array
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        
-        # Generate sine wave
-        tone = np.sin(2 * np.pi * frequency * t) * 0.5
+        # Generate sine wave in place from the sample index
+        num_samples = int(sample_rate * duration)
+        tone = np.arange(num_samples, dtype=np.float32)
+        tone *= 2 * np.pi * frequency / sample_rate
+        np.sin(tone, out=tone)
+        tone *= 0.5
         
         # Apply fade in/out
         fade_duration = 0.1  # seconds
         fade_samples = int(fade_duration * sample_rate)
         
-        fade_in = np.linspace(0, 1, fade_samples)
-        fade_out = np.linspace(1, 0, fade_samples)
-        
-        tone[:fade_samples] *= fade_in
-        tone[-fade_samples:] *= fade_out
+        fade = np.linspace(0, 1, fade_samples, dtype=np.float32)
+        tone[:fade_samples] *= fade
+        tone[-fade_samples:] *= fade[::-1]
         
         # Convert to 16-bit PCM
-        audio_data = (tone * 32767).astype(np.int16)
-        
-        # Save to temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        temp_file.close()
+        tone *= 32767
+        audio_data = tone.astype(np.int16)
         
-        wavfile.write(temp_file.name, sample_rate, audio_data)
+        # Write the wav in memory and encode to base64
+        wav_buffer = io.BytesIO()
+        wavfile.write(wav_buffer, sample_rate, audio_data)
         
-        # Read and encode to base64
-        with open(temp_file.name, "rb") as wav_file:
-            encoded_string = base64.b64encode(wav_file.read()).decode('utf-8')
-        
-        # Clean up
-        os.unlink(temp_file.name)
-        
-        return encoded_string
+        return base64.b64encode(wav_buffer.getvalue()).decode('utf-8')
         
     except Exception as e:
         print(f"Error generating fallback speech: {e}")
         # Return empty string if all else fails
-        return ""
\ No newline at end of file
+        return ""
+
+# The fallback tone never changes, so generate it once at import. Callers
+# compare against it to avoid caching audio from a failed synthesis.
+FALLBACK_SPEECH = _make_fallback_tone()
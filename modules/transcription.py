@@ -1,21 +1,197 @@
-import whisper
-import tempfile
 import os
+import time
+import queue
+import threading
+import numpy as np
+import ctranslate2
+from concurrent.futures import Future
+from faster_whisper import WhisperModel, BatchedInferencePipeline, decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
 
 # Load the whisper model (this will download it if not already cached)
-# Using "base" model for balance of accuracy and speed
+# Using "base" model for balance of accuracy and speed, served by
+# CTranslate2 and batched over the audio's speech chunks
 model = None
 
+# Model size or path to a pre-converted CTranslate2 model directory, so
+# deployments can ship the int8 model instead of downloading it on first run
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+
+# Whisper expects 16kHz audio
+SAMPLE_RATE = 16000
+
+# Longest utterance that fits in a single Whisper window (seconds)
+CHUNK_LENGTH = 30
+
+# Maximum number of utterances transcribed in one batch
+MAX_BATCH_SIZE = 8
+
+# How long to wait for more requests before dispatching a batch (seconds)
+BATCH_WINDOW = 0.03
+
+# Relative duration difference allowed between utterances in one batch
+DURATION_TOLERANCE = 0.2
+
 def load_model():
     global model
     if model is None:
-        model = whisper.load_model("base")
+        if ctranslate2.get_cuda_device_count() > 0:
+            whisper_model = WhisperModel(WHISPER_MODEL, device="cuda", compute_type="int8_float16")
+        else:
+            # int8 weights on CPU, leaving one core free for the web server
+            whisper_model = WhisperModel(
+                WHISPER_MODEL,
+                device="cpu",
+                compute_type="int8",
+                cpu_threads=max(1, (os.cpu_count() or 1) - 1),
+                num_workers=1,
+            )
+        model = BatchedInferencePipeline(model=whisper_model)
     return model
 
+def warm_up_model():
+    """Load the model and run it once on silence so the first request is fast"""
+    silence = np.zeros(SAMPLE_RATE * 15, dtype=np.float32)
+    
+    # Skip VAD so the silent clip actually reaches the model
+    segments, _ = load_model().transcribe(silence, batch_size=8, without_timestamps=True, vad_filter=False)
+    list(segments)
+
+class TranscriptionBatcher:
+    """
+    Coalesces concurrent transcription requests into batched model calls
+    
+    Requests arriving within BATCH_WINDOW of each other are grouped by
+    duration and each group is transcribed in a single pass.
+    """
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, audio_path):
+        """
+        Queue an audio file for transcription
+        
+        Args:
+            audio_path: Path to the audio file
+            
+        Returns:
+            Future resolving to the transcribed text
+        """
+        audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+        future = Future()
+        
+        self._start()
+        self._queue.put((audio, future))
+        return future
+    
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            # Block for the first request, then collect more until the window closes
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_WINDOW
+            
+            while len(pending) < MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            for group in _group_by_duration(pending):
+                try:
+                    texts = _transcribe_batch([audio for audio, _ in group])
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+                
+                for (_, future), text in zip(group, texts):
+                    future.set_result(text)
+
+def _group_by_duration(pending):
+    """Group (audio, future) pairs whose durations are within DURATION_TOLERANCE"""
+    groups = []
+    for item in sorted(pending, key=lambda item: len(item[0])):
+        if groups and len(item[0]) <= len(groups[-1][0][0]) * (1 + DURATION_TOLERANCE):
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+    return groups
+
+def _transcribe_batch(audios):
+    """
+    Transcribe several decoded utterances with one model call
+    
+    Args:
+        audios: List of 16kHz float32 audio arrays
+        
+    Returns:
+        List of transcribed texts, in the same order
+    """
+    model = load_model()
+    
+    # Single or long utterances go through the regular VAD-chunked path
+    if len(audios) == 1 or any(len(audio) > CHUNK_LENGTH * SAMPLE_RATE for audio in audios):
+        texts = []
+        for audio in audios:
+            segments, _ = model.transcribe(audio, batch_size=MAX_BATCH_SIZE, without_timestamps=True)
+            texts.append(" ".join(segment.text.strip() for segment in segments).strip())
+        return texts
+    
+    # Pad every utterance to the longest one and lay them end to end, with
+    # one clip per utterance so each becomes its own item in the batch.
+    # Clips bypass the pipeline's VAD, so run it per utterance here and trim
+    # each clip to the detected speech; utterances with no speech are skipped
+    vad_options = VadOptions(max_speech_duration_s=CHUNK_LENGTH, min_silence_duration_ms=160)
+    padded_length = max(len(audio) for audio in audios)
+    batch = np.zeros(padded_length * len(audios), dtype=np.float32)
+    clip_timestamps = []
+    for i, audio in enumerate(audios):
+        start = i * padded_length
+        batch[start:start + len(audio)] = audio
+        
+        speech = get_speech_timestamps(audio, vad_options, sampling_rate=SAMPLE_RATE)
+        if speech:
+            clip_timestamps.append({"start": start + speech[0]["start"], "end": start + speech[-1]["end"]})
+    
+    if not clip_timestamps:
+        return ["" for _ in audios]
+    
+    segments, _ = model.transcribe(
+        batch,
+        batch_size=len(clip_timestamps),
+        without_timestamps=True,
+        clip_timestamps=clip_timestamps,
+    )
+    
+    # Map each segment back to its utterance by where it starts, allowing
+    # for segment start times being rounded to the millisecond
+    texts = [[] for _ in audios]
+    for segment in segments:
+        index = min(int((segment.start + 0.01) * SAMPLE_RATE) // padded_length, len(audios) - 1)
+        texts[index].append(segment.text.strip())
+    
+    return [" ".join(parts).strip() for parts in texts]
+
+batcher = TranscriptionBatcher()
+
 def transcribe_audio(audio_path):
     """
     Transcribe audio using Whisper
     
+    Concurrent calls are batched together by the shared TranscriptionBatcher.
+    
     Args:
         audio_path: Path to the audio file
         
@@ -23,13 +199,7 @@ def transcribe_audio(audio_path):
         Transcribed text
     """
     try:
-        # Load model if not already loaded
-        model = load_model()
-        
-        # Transcribe audio
-        result = model.transcribe(audio_path)
-        
-        return result["text"].strip()
+        return batcher.submit(audio_path).result()
     except Exception as e:
         print(f"Error transcribing audio: {e}")
-        raise e
\ No newline at end of file
+        raise e
@@ -19,6 +19,7 @@ const restartBtn = document.getElementById('restartBtn');
 let audioRecorder = null;
 let selectedLevel = null;
 let isContinuousListening = false;
+let audioQueue = Promise.resolve();
 
 // Initialize the application
 document.addEventListener('DOMContentLoaded', () => {
@@ -159,7 +160,7 @@ async function processAudio(audioBlob, transcript = null) {
     try {
         // Create form data
         const formData = new FormData();
-        formData.append('audio', audioBlob, 'recording.wav');
+        formData.append('audio', audioBlob, recordingFilename(audioBlob));
         
         // If we have a transcript from the speech recognition API, add it to the form
         if (transcript) {
@@ -173,33 +174,60 @@ async function processAudio(audioBlob, transcript = null) {
         });
         
         if (!response.ok) {
-            throw new Error('Failed to process audio');
+            // Surface the server's reason, e.g. an expired session
+            const data = await response.json().catch(() => ({}));
+            const error = new Error('Failed to process audio');
+            error.userMessage = data.error;
+            throw error;
         }
         
-        const data = await response.json();
-        
-        // Add user message to chat
-        addMessage(data.transcription, 'user');
-        
-        // Add bot response to chat
-        addMessage(data.response, 'bot');
-        
-        // Play audio response
-        if (data.audio) {
-            playAudio(data.audio);
-        }
+        // The response is streamed one sentence at a time as newline-delimited JSON
+        let botMessage = null;
+        await readNDJSON(response, (data) => {
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            
+            // Add user message to chat
+            if (data.transcription !== undefined) {
+                addMessage(data.transcription, 'user');
+            }
+            
+            // Add each bot sentence to the same chat message as it arrives
+            if (data.audio !== undefined) {
+                if (!botMessage) {
+                    botMessage = addMessage(data.response, 'bot');
+                } else {
+                    botMessage.textContent += ` ${data.response}`;
+                }
+                
+                // Queue audio so sentences play back in order
+                queueAudio(data.audio);
+            }
+        });
         
         setStatus(isContinuousListening ? 
             'Microphone still listening. Continue speaking when ready.' : 
             'Your turn. Press the button to speak.');
     } catch (error) {
         console.error('Error processing audio:', error);
-        showError('Failed to process your speech. Please try again.');
+        showError(error.userMessage || 'Failed to process your speech. Please try again.');
     } finally {
         showLoading(false);
     }
 }
 
+/**
+ * Pick an upload filename matching the recorder's container format
+ * @param {Blob} audioBlob - Recorded audio blob
+ * @returns {string} Filename with extension
+ */
+function recordingFilename(audioBlob) {
+    if (audioBlob.type.includes('ogg')) return 'recording.ogg';
+    if (audioBlob.type.includes('mp4')) return 'recording.m4a';
+    return 'recording.webm';
+}
+
 /**
  * End the conversation and show evaluation
  */
@@ -230,7 +258,10 @@ async function endConversation() {
         });
         
         if (!response.ok) {
-            throw new Error('Failed to generate evaluation');
+            const data = await response.json().catch(() => ({}));
+            const error = new Error('Failed to generate evaluation');
+            error.userMessage = data.error;
+            throw error;
         }
         
         const data = await response.json();
@@ -246,7 +277,7 @@ async function endConversation() {
         
     } catch (error) {
         console.error('Error ending conversation:', error);
-        showError('Failed to generate evaluation. Please try again.');
+        showError(error.userMessage || 'Failed to generate evaluation. Please try again.');
     } finally {
         showLoading(false);
     }
@@ -285,6 +316,38 @@ function addMessage(text, sender) {
     
     chatContainer.appendChild(messageDiv);
     chatContainer.scrollTop = chatContainer.scrollHeight;
+    
+    return messageDiv;
+}
+
+/**
+ * Read a newline-delimited JSON response as it streams in
+ * @param {Response} response - Fetch response
+ * @param {Function} onMessage - Function to call with each parsed message
+ */
+async function readNDJSON(response, onMessage) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        
+        for (const line of lines) {
+            if (line.trim()) {
+                onMessage(JSON.parse(line));
+            }
+        }
+    }
+    
+    if (buffered.trim()) {
+        onMessage(JSON.parse(buffered));
+    }
 }
 
 /**
@@ -293,13 +356,42 @@ function addMessage(text, sender) {
  */
 function playAudio(base64Audio) {
     try {
-        const audio = new Audio(`data:audio/wav;base64,${base64Audio}`);
+        const audio = new Audio(audioDataURL(base64Audio));
         audio.play();
     } catch (error) {
         console.error('Error playing audio:', error);
     }
 }
 
+/**
+ * Build a data URL for base64 audio, which is either mp3 or a wav fallback
+ * @param {string} base64Audio - Base64 encoded audio
+ * @returns {string} Data URL
+ */
+function audioDataURL(base64Audio) {
+    // "UklGR" is the base64 encoding of a RIFF (wav) header
+    const mimeType = base64Audio.startsWith('UklGR') ? 'audio/wav' : 'audio/mpeg';
+    return `data:${mimeType};base64,${base64Audio}`;
+}
+
+/**
+ * Queue base64 audio to play after any audio already queued
+ * @param {string} base64Audio - Base64 encoded audio
+ */
+function queueAudio(base64Audio) {
+    audioQueue = audioQueue.then(() => new Promise((resolve) => {
+        try {
+            const audio = new Audio(audioDataURL(base64Audio));
+            audio.onended = resolve;
+            audio.onerror = resolve;
+            audio.play().catch(resolve);
+        } catch (error) {
+            console.error('Error playing audio:', error);
+            resolve();
+        }
+    }));
+}
+
 /**
  * Show or hide loading indicator
  * @param {boolean} show - Whether to show loading
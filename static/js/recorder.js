@@ -145,7 +145,7 @@ class AudioRecorder {
         return new Promise((resolve, reject) => {
             if (this.recorder && this.recorder.state === 'recording') {
                 this.recorder.onstop = () => {
-                    const audioBlob = new Blob(this.audioChunks, { type: 'audio/wav' });
+                    const audioBlob = new Blob(this.audioChunks, { type: this.recorder.mimeType || 'audio/webm' });
                     this.isRecording = false;
                     resolve(audioBlob);
                 };
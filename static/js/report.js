@@ -55,13 +55,47 @@ function generateReportHTML(reportData) {
         
         <div class="report-section">
             <h3>Detailed Evaluation</h3>
-            <div>${reportData.detailed_evaluation || 'No detailed evaluation available.'}</div>
+            ${getEvaluationHTML(reportData.detailed_evaluation)}
         </div>
     `;
     
     return html;
 }
 
+/**
+ * Generate HTML for the detailed evaluation
+ * @param {Object|string} evaluation - Structured evaluation, or plain text
+ * @returns {string} HTML for the evaluation
+ */
+function getEvaluationHTML(evaluation) {
+    if (!evaluation) {
+        return '<div>No detailed evaluation available.</div>';
+    }
+    
+    if (typeof evaluation === 'string') {
+        return `<div>${evaluation}</div>`;
+    }
+    
+    const sections = [
+        ['fluency', 'Fluency'],
+        ['pronunciation', 'Pronunciation'],
+        ['grammar', 'Grammar'],
+        ['vocabulary', 'Vocabulary']
+    ];
+    
+    const sectionsHTML = sections
+        .filter(([key]) => evaluation[key])
+        .map(([key, title]) => `<p><strong>${title}:</strong> ${evaluation[key]}</p>`)
+        .join('');
+    
+    const suggestions = Array.isArray(evaluation.suggestions) ? evaluation.suggestions : [];
+    const suggestionsHTML = suggestions.length > 0
+        ? `<p><strong>Suggestions:</strong></p><ul>${suggestions.map(suggestion => `<li>${suggestion}</li>`).join('')}</ul>`
+        : '';
+    
+    return `<div>${sectionsHTML}${suggestionsHTML}</div>`;
+}
+
 /**
  * Generate a visual level indicator
  * @param {string} level - User's English level
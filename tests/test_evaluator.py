@@ -0,0 +1,55 @@
+import os
+import re
+
+import pytest
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from modules.evaluator import extract_common_mistakes, word_stats
+
+# Pattern list and matching as they were before the patterns were combined
+BASELINE_PATTERNS = [
+    (r'\bi am (agree|disagree)', "Using 'I am agree' instead of 'I agree'"),
+    (r'\bthe\s+([a-z]+ing)\b', "Potentially incorrect use of 'the' with gerund"),
+    (r'\b(make|makes|made)\s+fun\b', "Using 'make fun' instead of 'have fun'"),
+    (r'\b(is|are|was|were)\s+consist', "Using 'is consist of' instead of 'consists of'"),
+    (r'\bdiscuss\s+about\b', "Using 'discuss about' instead of just 'discuss'"),
+    (r'\badvice\s+(to|for)\s+\w+\b', "Using 'advice to' instead of 'advise'"),
+    (r'\b(look|looks|looked)\s+forward\s+to\s+([a-z]+ing)', "Correct use of 'look forward to' + gerund"),
+    (r'\b(look|looks|looked)\s+forward\s+to\s+(\w+[^ing\s])\b', "Incorrect use of 'look forward to' without gerund"),
+]
+
+def baseline_mistakes(text):
+    return {description for pattern, description in BASELINE_PATTERNS
+            if re.search(pattern, text, re.IGNORECASE)}
+
+@pytest.mark.parametrize("text", [
+    "I look forward to the meeting",
+    "I look forward to meetings",
+    "I looked forward to seeing the running race",
+    "I am agree that we should discuss about it",
+    "He made fun of the painting and it was consist of colors",
+    "She gave advice to him",
+    "We had a nice day",
+    "",
+])
+def test_extract_common_mistakes_matches_baseline(text):
+    found = extract_common_mistakes(text.lower())
+    expected = baseline_mistakes(text)
+    
+    assert len(found) == len(set(found))
+    if len(expected) <= 3:
+        assert set(found) == expected
+    else:
+        assert len(found) == 3 and set(found) <= expected
+
+def test_extract_common_mistakes_reports_first_seen_order():
+    text = "we discuss about it. i am agree."
+    assert extract_common_mistakes(text) == [
+        "Using 'discuss about' instead of just 'discuss'",
+        "Using 'I am agree' instead of 'I agree'",
+    ]
+
+def test_word_stats():
+    assert word_stats("the cat and the hat") == (5, 4)
+    assert word_stats("") == (0, 0)
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from modules import response_cache
+from modules.response_cache import context_key, embed_utterance, find_response, store_response
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(response_cache, "_buckets", OrderedDict())
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_context_key_uses_level_and_last_messages():
+    history = [
+        {"role": "assistant", "content": "Hi, I'm Sam. How are you?"},
+        {"role": "user", "content": "I'm fine."},
+        {"role": "assistant", "content": "What do you like to do?"},
+    ]
+    
+    assert context_key("Beginner", history) == context_key("Beginner", [{"role": "user", "content": "Other"}] + history[1:])
+    assert context_key("Beginner", history) != context_key("Advanced", history)
+    assert context_key("Beginner", history) != context_key("Beginner", history[:2])
+
+def test_finds_similar_utterance_in_same_context():
+    store_response("context", unit(1, 0, 0), ["Hello."], ["audio"])
+    
+    assert find_response("context", unit(1, 0.1, 0)) == (["Hello."], ["audio"])
+    assert find_response("context", unit(0, 1, 0)) is None
+    assert find_response("other", unit(1, 0, 0)) is None
+
+def test_returns_most_similar_entry():
+    store_response("context", unit(1, 0, 0), ["First."], ["a"])
+    store_response("context", unit(0, 1, 0), ["Second."], ["b"])
+    
+    assert find_response("context", unit(0.1, 1, 0)) == (["Second."], ["b"])
+
+def test_evicts_least_recently_used_context(monkeypatch):
+    monkeypatch.setattr(response_cache, "MAX_CONTEXTS", 2)
+    store_response("a", unit(1, 0), ["A."], ["a"])
+    store_response("b", unit(1, 0), ["B."], ["b"])
+    find_response("a", unit(1, 0))
+    store_response("c", unit(1, 0), ["C."], ["c"])
+    
+    assert list(response_cache._buckets) == ["a", "c"]
+
+def test_keeps_latest_entries_per_context(monkeypatch):
+    monkeypatch.setattr(response_cache, "MAX_ENTRIES_PER_CONTEXT", 2)
+    store_response("context", unit(1, 0, 0), ["First."], ["a"])
+    store_response("context", unit(0, 1, 0), ["Second."], ["b"])
+    store_response("context", unit(0, 0, 1), ["Third."], ["c"])
+    
+    assert find_response("context", unit(1, 0, 0)) is None
+    assert response_cache._buckets["context"]["matrix"].shape == (2, 3)
+
+def test_embedding_failure_is_a_miss(monkeypatch):
+    class BrokenModel:
+        def encode(self, *args, **kwargs):
+            raise OSError("model unavailable")
+    
+    monkeypatch.setattr(response_cache, "model", BrokenModel())
+    embedding = embed_utterance("hello")
+    
+    assert embedding is None
+    assert find_response("context", embedding) is None
+    store_response("context", embedding, ["Hello."], ["audio"])
+    assert len(response_cache._buckets) == 0
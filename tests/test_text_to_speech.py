@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import text_to_speech
+from modules.text_to_speech import text_to_speech_in_order
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+@pytest.fixture(autouse=True)
+def fake_tts(monkeypatch):
+    # Longer sentences finish first, so results arrive out of order
+    def synthesize(sentence):
+        time.sleep(0.05 / len(sentence))
+        return f"audio:{sentence}"
+    monkeypatch.setattr(text_to_speech, "text_to_speech", synthesize)
+
+def test_yields_in_original_order(executor):
+    sentences = ["A.", "Longer one.", "The longest sentence."]
+    
+    assert list(text_to_speech_in_order(sentences, executor)) == [
+        (sentence, f"audio:{sentence}") for sentence in sentences
+    ]
+
+def test_yields_audio_before_next_sentence_arrives(executor):
+    first_sent = threading.Event()
+    
+    def sentences():
+        yield "Hello."
+        # The LLM only produces the next sentence once the first audio is out
+        yield "Sent in time." if first_sent.wait(timeout=2) else "Too late."
+    
+    results = []
+    for sentence, _ in text_to_speech_in_order(sentences(), executor):
+        results.append(sentence)
+        first_sent.set()
+    
+    assert results == ["Hello.", "Sent in time."]
+
+def test_raises_after_yielding_finished_sentences(executor):
+    def sentences():
+        yield "One."
+        yield "Two."
+        raise RuntimeError("stream failed")
+    
+    results = []
+    with pytest.raises(RuntimeError, match="stream failed"):
+        for sentence, _ in text_to_speech_in_order(sentences(), executor):
+            results.append(sentence)
+    
+    assert results == ["One.", "Two."]
+
+def test_empty_source(executor):
+    assert list(text_to_speech_in_order(iter([]), executor)) == []
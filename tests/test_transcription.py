@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from modules import transcription
+from modules.transcription import SAMPLE_RATE, _group_by_duration, _transcribe_batch
+
+class FakeModel:
+    """Returns one segment per clip, timed like faster-whisper (rounded to the millisecond)"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def transcribe(self, audio, batch_size=8, without_timestamps=True, clip_timestamps=None, vad_filter=True):
+        self.calls.append(clip_timestamps)
+        if clip_timestamps is None:
+            return iter([SimpleNamespace(start=0.0, text=f" whole {len(audio)}")]), None
+        
+        segments = [
+            SimpleNamespace(start=round(clip["start"] / SAMPLE_RATE, 3), text=f" clip {clip['end'] - clip['start']}")
+            for clip in clip_timestamps
+        ]
+        return iter(segments), None
+
+def fake_speech_timestamps(audio, vad_options=None, sampling_rate=SAMPLE_RATE):
+    """Treat every non-zero sample as speech"""
+    speech = np.flatnonzero(audio)
+    if len(speech) == 0:
+        return []
+    return [{"start": int(speech[0]), "end": int(speech[-1]) + 1}]
+
+@pytest.fixture
+def model(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(transcription, "load_model", lambda: model)
+    monkeypatch.setattr(transcription, "get_speech_timestamps", fake_speech_timestamps)
+    return model
+
+def utterance(length, speech_start=0, speech_end=None):
+    audio = np.zeros(length, dtype=np.float32)
+    audio[speech_start:length if speech_end is None else speech_end] = 1
+    return audio
+
+def test_group_by_duration():
+    pending = [(np.zeros(length), length) for length in [1200, 1000, 5000, 1100, 5500, 2000]]
+    groups = _group_by_duration(pending)
+    
+    assert [[tag for _, tag in group] for group in groups] == [[1000, 1100, 1200], [2000], [5000, 5500]]
+
+def test_batch_maps_segments_to_their_utterances(model):
+    audios = [
+        utterance(SAMPLE_RATE, 4000, 12000),
+        utterance(SAMPLE_RATE - 500, 100, 200),
+        utterance(SAMPLE_RATE - 1000),
+    ]
+    
+    assert _transcribe_batch(audios) == ["clip 8000", "clip 100", f"clip {SAMPLE_RATE - 1000}"]
+    
+    # Each clip is trimmed to the detected speech and offset into its slot
+    assert model.calls == [[
+        {"start": 4000, "end": 12000},
+        {"start": SAMPLE_RATE + 100, "end": SAMPLE_RATE + 200},
+        {"start": 2 * SAMPLE_RATE, "end": 3 * SAMPLE_RATE - 1000},
+    ]]
+
+def test_batch_tolerates_rounded_segment_starts(model):
+    # Slot starts at 16001 samples, which rounds down to 1.000s = 16000 samples
+    audios = [utterance(SAMPLE_RATE + 1), utterance(SAMPLE_RATE)]
+    
+    assert _transcribe_batch(audios) == [f"clip {SAMPLE_RATE + 1}", f"clip {SAMPLE_RATE}"]
+
+def test_batch_returns_empty_text_without_speech(model):
+    audios = [utterance(SAMPLE_RATE, 0, 0), utterance(SAMPLE_RATE, 8000)]
+    
+    assert _transcribe_batch(audios) == ["", "clip 8000"]
+    assert model.calls == [[{"start": SAMPLE_RATE + 8000, "end": 2 * SAMPLE_RATE}]]
+
+def test_batch_skips_model_when_nothing_is_spoken(model):
+    audios = [utterance(SAMPLE_RATE, 0, 0), utterance(SAMPLE_RATE, 0, 0)]
+    
+    assert _transcribe_batch(audios) == ["", ""]
+    assert model.calls == []
+
+def test_single_utterance_uses_regular_path(model):
+    assert _transcribe_batch([utterance(SAMPLE_RATE)]) == [f"whole {SAMPLE_RATE}"]
+    assert model.calls == [None]